@@ -7,6 +7,8 @@ from math import ceil, floor
 from src.intents import prepare_swap_intent
 from src.quote import Quote
 from src.mpc import request_mpc_signature, convert_mpc_signature_to_secp256k1
+from src.journal import TickJournal
+from src.profiler import create_profiler, profile_stage
 import time
 
 from Crypto.Hash import keccak
@@ -63,7 +65,6 @@ async def fetch_quote(
     res = await loop.run_in_executor(None, post_to_solver_relay_2, req_data)
     # res = post_to_solver_relay_2(req_data)
     data = res.json()
-    print(f"data: {data}")
     return [Quote(**quote) for quote in data.get("result", [])] if "result" in data and data.get("result", []) else None
 
 async def get_quotes(token_dict: Dict[str, int], sell: bool=True) -> List[List[Quote]]:
@@ -83,7 +84,6 @@ async def get_quotes(token_dict: Dict[str, int], sell: bool=True) -> List[List[Q
                         "exact_amount_in": str(value),  # Assuming intentsBalance is also a list
                         "defuse_asset_identifier_out": token_id,
                     })
-        print(f"Items: {items}")
     
         quotes: List[List[Quote] | None]  = await asyncio.gather(*[
             fetch_quote(
@@ -93,7 +93,6 @@ async def get_quotes(token_dict: Dict[str, int], sell: bool=True) -> List[List[Q
                 # exact_amount_out=item["exact_amount_out"] if "exact_amount_out" in item else None
             ) for item in items
         ])   
-        print(f"Quotes: {quotes}")
         quotes = list(filter(lambda quote: quote is not None, list(map(lambda quote: quote[0] if not quote is None else None, quotes))))
         return quotes
     except Exception as e:
@@ -103,7 +102,7 @@ async def get_quotes(token_dict: Dict[str, int], sell: bool=True) -> List[List[Q
 
 
 
-def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances) -> Dict[str, int]:
+def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances, details: Optional[Dict] = None) -> Dict[str, int]:
     """
     Calculate how much of each coin to buy or sell to rebalance portfolio.
     
@@ -111,6 +110,7 @@ def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances) -> Di
         tokens: Dict mapping coin identifiers to their target weights (100 = 1%)
         raw_quotes: List of Quote objects with conversion rates
         current_balances: Dict mapping coin identifiers to their current balances
+        details: Optional dict filled with the intermediate conversion rates, values and diffs
     
     Returns:
         Dict mapping coin identifiers to amount to buy (positive) or sell (negative)
@@ -138,18 +138,15 @@ def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances) -> Di
         value_in_usdc = current_balance * conversion_rate
         
         coin_values_usdc[coin_id] = value_in_usdc
-        print(f"Coin: {coin_id} Conversion rate: {conversion_rate} Balance: {current_balance} Value USDC: {value_in_usdc}")
         
         # Add to total portfolio value
         total_portfolio_value_usdc += value_in_usdc
-    print(f"Total val {total_portfolio_value_usdc}")
     
     # Step 2: Calculate target values based on weights
     target_values_usdc = {}
     for coin_id, weight in tokens.items():
         # Convert weight from "100 = 1%" to decimal
         target_values_usdc[coin_id] = total_portfolio_value_usdc * weight /10000
-        print(f"Convert total:{total_portfolio_value_usdc} target: {target_values_usdc[coin_id]}")
     
     # Step 3: Calculate differences (how much to buy/sell in USDC)
     differences_usdc = {}
@@ -157,7 +154,6 @@ def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances) -> Di
         current_value = coin_values_usdc.get(coin_id, 0)
         target_value = target_values_usdc.get(coin_id, 0)
         diff = target_value - current_value
-        print(f"Current: {current_value} Target: {target_value} diff: {diff}")
         differences_usdc[coin_id] = diff
     
     # Step 4: Convert USDC differences to native coin amounts
@@ -173,10 +169,18 @@ def calculate_rebalance(tokens, raw_quotes: List[Quote], current_balances) -> Di
             # To keep from overdraft
             if coin_amount > 5000:
                 coin_amount -= 5000
-            print(f"Rebalance {coin_id}: {coin_amount} ({usdc_diff} USDC)")
             if coin_amount != 0:
                 rebalance_amounts[coin_id] = coin_amount
     
+    if details is not None:
+        details.update({
+            "conversion_rates": conversion_rates,
+            "values_usdc": coin_values_usdc,
+            "total_value_usdc": total_portfolio_value_usdc,
+            "target_values_usdc": target_values_usdc,
+            "differences_usdc": differences_usdc,
+        })
+    
     return rebalance_amounts
 
 async def run(env: Environment):
@@ -193,163 +197,181 @@ async def run(env: Environment):
     else:
         pass
     
-    # Step 2: Get agent's info
-    near = env.set_near(account_id=agent_id, private_key=env.env_vars["pk"])
+    journal = TickJournal(env.env_vars.get("journal_dir", "journal"))
+    profiler = create_profiler(env.env_vars)
+    if profiler:
+        profiler.start()
     
-    result = await near.view(
-        contract_id=contract_id,
-        method_name="get_agent_info",
-        args={"agent_id": agent_id}
-    )
+    try:
+        # Step 2: Get agent's info
+        near = env.set_near(account_id=agent_id, private_key=env.env_vars["pk"])
     
-    agent_info = result.result if result else None
-    if agent_info:
-        print("Agent info: {str(agent_info)}")
+        with profile_stage(profiler, "agent_info"):
+            result = await near.view(
+                contract_id=contract_id,
+                method_name="get_agent_info",
+                args={"agent_id": agent_id}
+            )
+    
+        agent_info = result.result if result else None
      
-    # Step 3: Get user's info and portfolio
-    for agent in agent_info:
-        print(f"Current agent: {agent}")
-        # TODO loop through all
-        result = await near.view(
-            contract_id=contract_id,
-            method_name="get_user_info",
-            args={"user_id": agent}
-        )
+        # Step 3: Get user's info and portfolio
+        for agent in agent_info:
+            # TODO loop through all
+            with profile_stage(profiler, "user_info"):
+                result = await near.view(
+                    contract_id=contract_id,
+                    method_name="get_user_info",
+                    args={"user_id": agent}
+                )
         
-        user_info = result.result if result else None
-        if user_info:
-            print(f"user_info: {user_info}")
+            user_info = result.result if result else None
+            if user_info:
+                journal.record(agent, "user_info", user_info)
             
-        near_intents_address = user_info["near_intents_address"]
-        tokens = user_info["required_spread"]
-        token_ids = list(tokens.keys())
-        if not USDC_TOKEN_ID in token_ids:
-            token_ids.append(USDC_TOKEN_ID)
-        
-        print(f"Deposit address: {near_intents_address}, tokens: {tokens}")
+            near_intents_address = user_info["near_intents_address"]
+            tokens = user_info["required_spread"]
+            token_ids = list(tokens.keys())
+            if not USDC_TOKEN_ID in token_ids:
+                token_ids.append(USDC_TOKEN_ID)
         
-        # Step 4: Get user's balances
-        result = await near.view(
-            contract_id="intents.near",
-            method_name="mt_batch_balance_of",
-            args={
-                "account_id": near_intents_address.lower(),
-                "token_ids": token_ids,      
-            }
-        )
+            # Step 4: Get user's balances
+            with profile_stage(profiler, "balances"):
+                result = await near.view(
+                    contract_id="intents.near",
+                    method_name="mt_batch_balance_of",
+                    args={
+                        "account_id": near_intents_address.lower(),
+                        "token_ids": token_ids,      
+                    }
+                )
         
-        intents_balance = result.result if result else None
+            intents_balance = result.result if result else None
         
-        intents_dict = {token_id: value for token_id, value in zip(token_ids, intents_balance)}
-        print(f"Intents: {str(intents_dict)}")
+            intents_dict = {token_id: value for token_id, value in zip(token_ids, intents_balance)}
+            journal.record(agent, "balances", intents_dict)
         
-        raw_quotes: List[List[Quote] | None]  = await get_quotes(intents_dict)
+            with profile_stage(profiler, "valuation_quotes"):
+                raw_quotes: List[List[Quote] | None]  = await get_quotes(intents_dict)
         
-        print(f"Raw Quotes: {', '.join([str(raw_quote) for raw_quote in raw_quotes])}")
+            journal.record(agent, "valuation_quotes", raw_quotes)
         
-        # Step 5: Calculate rebalanced portfolio
-        try:
-            rebalance = calculate_rebalance(tokens, raw_quotes, intents_dict)
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            traceback.print_exc()
+            # Step 5: Calculate rebalanced portfolio
+            rebalance_details = {}
+            try:
+                with profile_stage(profiler, "rebalance"):
+                    rebalance = calculate_rebalance(tokens, raw_quotes, intents_dict, rebalance_details)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                traceback.print_exc()
             
-        print(f"Rebalance: {rebalance}")
+            journal.record(agent, "rebalance", {"amounts": rebalance, **rebalance_details})
         
-        buy_tokens_dict = {}
-        sell_token_dict = {}
-        for token_id, value in rebalance.items():
-            if value > 0:
-                buy_tokens_dict[token_id] = value
-            else:
-                sell_token_dict[token_id] = -1*value
-        print(f"Buy token dict {buy_tokens_dict}")
-        # Convert rebalance into quotes
+            buy_tokens_dict = {}
+            sell_token_dict = {}
+            for token_id, value in rebalance.items():
+                if value > 0:
+                    buy_tokens_dict[token_id] = value
+                else:
+                    sell_token_dict[token_id] = -1*value
+            # Convert rebalance into quotes
         
         
-        # Sell and then buy
-        for token_dict, sell in [(sell_token_dict, True), (buy_tokens_dict, False)]:
-            raw_quotes = await get_quotes(token_dict, sell=sell)
-            if len(raw_quotes) == 0:
-                print(f"No quotes to {'sell' if sell else 'buy'}")
-                continue
-            # raw_quotes: List[Quote] = list(filter(lambda quote: quote is not None, list(map(lambda quote: quote[0] if not quote is None else None, quotes))))
-            print(f"Raw Quotes: {', '.join([str(raw_quote) for raw_quote in raw_quotes])}")
+            # Sell and then buy
+            for token_dict, sell in [(sell_token_dict, True), (buy_tokens_dict, False)]:
+                with profile_stage(profiler, "sell_quotes" if sell else "buy_quotes"):
+                    raw_quotes = await get_quotes(token_dict, sell=sell)
+                if len(raw_quotes) == 0:
+                    print(f"No quotes to {'sell' if sell else 'buy'}")
+                    continue
+                # raw_quotes: List[Quote] = list(filter(lambda quote: quote is not None, list(map(lambda quote: quote[0] if not quote is None else None, quotes))))
+                journal.record(agent, "sell_quotes" if sell else "buy_quotes", raw_quotes)
             
-            try:
-                result = await prepare_swap_intent(raw_quotes, near_intents_address)
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                traceback.print_exc()
+                try:
+                    with profile_stage(profiler, "intent"):
+                        result = await prepare_swap_intent(raw_quotes, near_intents_address)
+                except Exception as e:
+                    print(f"An error occurred: {e}")
+                    traceback.print_exc()
                 
-            intents = result["intents"]
-            quote_hashes = result["quote_hashes"]
-            print(f"Intents result: {result}")
+                intents = result["intents"]
+                quote_hashes = result["quote_hashes"]
+                journal.record(agent, "intents", result)
             
-            # Add the ERC-191 prefix to the message
-            intents_message = json.dumps(intents, separators=(',', ':'))
-            print(f"Intents msg: len: {len(intents_message)} and {intents_message}")
-            prefix = f"\x19Ethereum Signed Message:\n{len(intents_message)}"
-            prefixed_message = prefix + intents_message
-            print("prefixed_message: ", prefixed_message)
+                # Add the ERC-191 prefix to the message
+                intents_message = json.dumps(intents, separators=(',', ':'))
+                prefix = f"\x19Ethereum Signed Message:\n{len(intents_message)}"
+                prefixed_message = prefix + intents_message
 
-            try:
-                # Encode the prefixed message to bytes
-                encoded = prefixed_message.encode("utf-8")
+                try:
+                    # Encode the prefixed message to bytes
+                    encoded = prefixed_message.encode("utf-8")
 
-                # 2. Compute a keccak256 hash of the encoded message
-                hash_value = keccak256(encoded)
+                    # 2. Compute a keccak256 hash of the encoded message
+                    hash_value = keccak256(encoded)
+                    journal.record(agent, "hash", {"nonce": intents["nonce"], "hash": hash_value})
 
-                # TODO change agent_info[1]
-                # Request the MPC signature
-                signatures = await request_mpc_signature({
-                    "signer_account": near,
-                    "contract_id": contract_id,
-                    "method_name": "balance_portfolio",
-                    "args": {
-                        "user_portfolio": agent,
-                        "hash": hash_value,
-                        "defuse_intents": intents,
-                    },
-                })
-                print("FINAL signatures: ", signatures)
+                    # TODO change agent_info[1]
+                    # Request the MPC signature
+                    with profile_stage(profiler, "mpc"):
+                        signatures = await request_mpc_signature({
+                            "signer_account": near,
+                            "contract_id": contract_id,
+                            "method_name": "balance_portfolio",
+                            "args": {
+                                "user_portfolio": agent,
+                                "hash": hash_value,
+                                "defuse_intents": intents,
+                            },
+                        })
+                    journal.record(agent, "signature", signatures)
 
-                # Convert MPC signature to secp256k1 format
-                formatted_signature = convert_mpc_signature_to_secp256k1(signatures)
+                    # Convert MPC signature to secp256k1 format
+                    formatted_signature = convert_mpc_signature_to_secp256k1(signatures)
 
-                # Prepare the signed data
-                signed_data = {
-                    "standard": "erc191",
-                    "payload": json.dumps(intents, separators=(',', ':')),
-                    "signature": formatted_signature,
-                }
-                print("signed_data: ", signed_data)
+                    # Prepare the signed data
+                    signed_data = {
+                        "standard": "erc191",
+                        "payload": json.dumps(intents, separators=(',', ':')),
+                        "signature": formatted_signature,
+                    }
 
-                # Post the signed data to the network
-                req_data = {
-                    "jsonrpc": "2.0",
-                    "id": "dontcare",
-                    "method": "publish_intent",
-                    "params": [
-                        {
-                            "signed_data": signed_data,
-                            "quote_hashes": quote_hashes,
-                        }
-                    ],
-                }
+                    # Post the signed data to the network
+                    req_data = {
+                        "jsonrpc": "2.0",
+                        "id": "dontcare",
+                        "method": "publish_intent",
+                        "params": [
+                            {
+                                "signed_data": signed_data,
+                                "quote_hashes": quote_hashes,
+                            }
+                        ],
+                    }
 
-                res = requests.post(
-                    "https://solver-relay-v2.chaindefuser.com/rpc",
-                    headers={"Content-Type": "application/json"},
-                    data=json.dumps(req_data),
-                    timeout=5000
-                )
-                print(f"Final response: {res}")
-                print(f"json: {res.json()}")
-            except Exception as e:
-                print(f"Exception: {e}")
-                traceback.print_exc()
-        
+                    with profile_stage(profiler, "publish"):
+                        res = requests.post(
+                            "https://solver-relay-v2.chaindefuser.com/rpc",
+                            headers={"Content-Type": "application/json"},
+                            data=json.dumps(req_data),
+                            timeout=5000
+                        )
+                    try:
+                        response = res.json()
+                    except ValueError:
+                        response = res.text
+                    journal.record(agent, "publish", {"status": res.status_code, "response": response})
+                    print(f"Publish status: {res.status_code}")
+                except Exception as e:
+                    print(f"Exception: {e}")
+                    traceback.print_exc()
+                    journal.record(agent, "error", {"error": str(e)})
+    finally:
+        try:
+            if profiler:
+                profiler.stop()
+        finally:
+            journal.close()
     
     
 asyncio.run(run(env))
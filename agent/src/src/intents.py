@@ -112,10 +112,8 @@ async def is_nonce_used(nonce, signer_id, near_rpc_url):
         "nonce": nonce,
         "account_id": signer_id.lower(),
     })
-    print(f"args: {args}")
     
     args_base64 = base64.b64encode(args.encode()).decode('utf-8')
-    print(f"args_base64: {args_base64}")
     
     req_data = {
         "jsonrpc": "2.0",
@@ -129,7 +127,6 @@ async def is_nonce_used(nonce, signer_id, near_rpc_url):
             "args_base64": args_base64,
         }
     }
-    print(f"req data: {req_data}")
     res = requests.post(
         near_rpc_url,
         headers={"Content-Type": "application/json"},
@@ -137,10 +134,8 @@ async def is_nonce_used(nonce, signer_id, near_rpc_url):
     )
     
     data = res.json()
-    print(f"data: {data}")
     result_data = data["result"]["result"]
     if isinstance(result_data, list):
         result_data = "".join(map(chr, result_data))  # Convert list of ASCII values to a string
     result = json.loads(result_data.encode('utf-8').decode('utf-8'))
-    print(f"result: {result}")
     return result
\ No newline at end of file
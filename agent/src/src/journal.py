@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import mmap
+import time
+import fcntl
+import struct
+import argparse
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+# Record header: magic, payload length, timestamp, user length, kind length.
+# The header is fixed size so a reader can skip a record without decoding it.
+RECORD_MAGIC = 0x544A
+RECORD_HEADER = struct.Struct("<HIdHH")
+
+JOURNAL_PREFIX = "journal-"
+JOURNAL_SUFFIX = ".bin"
+
+
+def _to_json(value):
+    # Quote, MpcSignature and friends are plain attribute bags
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+
+class TickJournal:
+    """
+    Append-only journal of agent tick inputs and outputs.
+
+    Each record is a fixed header followed by the user id, the record kind and
+    a compact JSON payload. The newest file is reused across runs until it
+    exceeds `max_bytes`, and the oldest files are removed once the journal
+    grows past `max_total_bytes`. The active file is held under an exclusive
+    lock, so overlapping runs each write to their own file.
+
+    Write failures are printed and swallowed so the journal never stops a trade.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_total_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, user_id: str, kind: str, data) -> None:
+        """
+        Append a record to the journal.
+
+        Args:
+            user_id: The user portfolio the record belongs to
+            kind: Short record type, e.g. "balances" or "publish"
+            data: JSON-serialisable payload
+        """
+        try:
+            payload = json.dumps(data, separators=(',', ':'), default=_to_json).encode("utf-8")
+            user = user_id.encode("utf-8")
+            kind_bytes = kind.encode("utf-8")
+            header = RECORD_HEADER.pack(RECORD_MAGIC, len(payload), time.time(), len(user), len(kind_bytes))
+
+            journal = self._current_file()
+            journal.write(header + user + kind_bytes + payload)
+            journal.flush()
+        except Exception as e:
+            print(f"Journal write failed for {kind}: {e}")
+
+    def close(self) -> None:
+        if self._file:
+            # Closing the file releases its lock
+            self._file.close()
+            self._file = None
+
+    def _current_file(self):
+        if self._file and self._file.tell() < self.max_bytes:
+            return self._file
+        reopen = self._file is None
+        self.close()
+
+        files = journal_files(self.directory)
+        if reopen and files and os.path.getsize(files[-1][1]) < self.max_bytes:
+            # Keep appending to the previous run's file unless another run still owns it
+            path = files[-1][1]
+            self._file = _open_locked(path)
+            if self._file:
+                _truncate_partial_record(self._file)
+        while self._file is None:
+            path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{time.time_ns()}{JOURNAL_SUFFIX}")
+            self._file = _open_locked(path)
+        self._prune(path)
+        return self._file
+
+    def _prune(self, current: str) -> None:
+        total = 0
+        for _, path in reversed(journal_files(self.directory)):
+            total += os.path.getsize(path)
+            if total <= self.max_total_bytes or path == current:
+                continue
+            # Leave files another run is still writing to
+            f = _open_locked(path)
+            if f:
+                os.remove(path)
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_locked(path: str):
+    # Returns the file opened for appending under an exclusive lock, or None if another run holds it
+    f = open(path, "ab")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def _truncate_partial_record(journal) -> None:
+    # A crash mid-write leaves a partial trailing record that would misalign appends.
+    # Only called with the file's lock held, so no other run is appending to it.
+    path = journal.name
+    size = os.path.getsize(path)
+    offset = 0
+    with open(path, "rb") as f:
+        while offset + RECORD_HEADER.size <= size:
+            f.seek(offset)
+            magic, payload_len, _, user_len, kind_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            end = offset + RECORD_HEADER.size + user_len + kind_len + payload_len
+            if magic != RECORD_MAGIC or end > size:
+                break
+            offset = end
+    if offset < size:
+        journal.truncate(offset)
+        journal.seek(0, os.SEEK_END)
+
+
+def journal_files(directory: str):
+    """
+    List journal files in `directory` as (start time in seconds, path), oldest first.
+    """
+    files = []
+    if not os.path.isdir(directory):
+        return files
+    for name in os.listdir(directory):
+        if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX):
+            started = int(name[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)]) / 1e9
+            files.append((started, os.path.join(directory, name)))
+    files.sort()
+    return files
+
+
+def read_journal(
+    directory: str,
+    user_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> Iterator[Tuple[float, str, str, dict]]:
+    """
+    Iterate over journal records, oldest file first. Records within a file are in time order.
+
+    Files are memory-mapped and only the payloads of matching records are decoded.
+
+    Args:
+        directory: Journal directory
+        user_id: Only yield records for this user
+        since: Only yield records at or after this Unix timestamp
+        until: Only yield records at or before this Unix timestamp
+
+    Returns:
+        Iterator of (timestamp, user_id, kind, data)
+    """
+    user_filter = user_id.encode("utf-8") if user_id is not None else None
+    files = journal_files(directory)
+
+    for started, path in files:
+        if until is not None and started > until:
+            break
+        # The last write is at or after every record in the file
+        if since is not None and os.path.getmtime(path) < since:
+            continue
+        if os.path.getsize(path) == 0:
+            continue
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            offset = 0
+            size = len(buf)
+            while offset + RECORD_HEADER.size <= size:
+                magic, payload_len, ts, user_len, kind_len = RECORD_HEADER.unpack_from(buf, offset)
+                if magic != RECORD_MAGIC:
+                    raise Exception(f"Corrupt journal record in {path} at offset {offset}")
+                start = offset + RECORD_HEADER.size
+                end = start + user_len + kind_len + payload_len
+                if end > size:
+                    # Partially written trailing record
+                    break
+                offset = end
+
+                if until is not None and ts > until:
+                    break
+                if since is not None and ts < since:
+                    continue
+                user = buf[start:start + user_len]
+                if user_filter is not None and user != user_filter:
+                    continue
+                kind = buf[start + user_len:start + user_len + kind_len].decode("utf-8")
+                data = json.loads(buf[start + user_len + kind_len:end])
+                yield ts, user.decode("utf-8"), kind, data
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the agent tick journal.")
+    parser.add_argument("directory", help="Journal directory")
+    parser.add_argument("--user", help="Only show records for this user")
+    parser.add_argument("--kind", help="Only show records of this kind")
+    parser.add_argument("--since", type=_parse_time, help="Unix timestamp or ISO date")
+    parser.add_argument("--until", type=_parse_time, help="Unix timestamp or ISO date")
+    args = parser.parse_args(argv)
+
+    for ts, user, kind, data in read_journal(args.directory, args.user, args.since, args.until):
+        if args.kind and kind != args.kind:
+            continue
+        sys.stdout.write(json.dumps({"ts": ts, "user": user, "kind": kind, "data": data}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
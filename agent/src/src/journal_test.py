@@ -0,0 +1,98 @@
+import os
+import time
+import tempfile
+
+from src.journal import TickJournal, RECORD_MAGIC, journal_files, read_journal
+
+# Run from agent/src with: python -m src.journal_test
+
+
+def check_reopen_and_torn_tail(directory):
+    for i in range(3):
+        with TickJournal(directory) as journal:
+            journal.record(f"u{i}", "balances", {"i": i})
+    assert len(journal_files(directory)) == 1
+
+    # Simulate a crash mid-write
+    path = journal_files(directory)[-1][1]
+    with open(path, "ab") as f:
+        f.write(RECORD_MAGIC.to_bytes(2, "little") + b"torn")
+
+    with TickJournal(directory) as journal:
+        journal.record("u3", "balances", {"i": 3})
+    users = [user for _, user, _, _ in read_journal(directory)]
+    assert users == ["u0", "u1", "u2", "u3"], users
+
+
+def check_overlapping_runs(directory):
+    first = TickJournal(directory)
+    second = TickJournal(directory)
+    first.record("a", "balances", {})
+    second.record("b", "balances", {})
+    first.record("a", "publish", {})
+    assert first._file.name != second._file.name
+    first.close()
+    second.close()
+    assert sorted(user for _, user, _, _ in read_journal(directory)) == ["a", "a", "b"]
+
+
+def check_rotate_and_prune(directory):
+    with TickJournal(directory, max_bytes=200, max_total_bytes=1000) as journal:
+        for i in range(50):
+            journal.record("u", "quotes", {"pad": "x" * 40, "i": i})
+    files = journal_files(directory)
+    assert len(files) > 1
+    assert sum(os.path.getsize(path) for _, path in files) <= 1000 + 200
+
+    # The newest records survive pruning
+    kept = [data["i"] for _, _, _, data in read_journal(directory)]
+    assert kept == sorted(kept) and kept[-1] == 49, kept
+
+
+def check_filtered_read(directory):
+    with TickJournal(directory, max_bytes=100) as journal:
+        journal.record("alice", "balances", {"n": 1})
+        journal.record("bob", "balances", {"n": 2})
+        time.sleep(0.05)
+        middle = time.time()
+        time.sleep(0.05)
+        journal.record("alice", "publish", {"n": 3})
+        journal.record("bob", "publish", {"n": 4})
+
+    alice = [data["n"] for _, _, _, data in read_journal(directory, user_id="alice")]
+    assert alice == [1, 3], alice
+    later = [data["n"] for _, _, _, data in read_journal(directory, since=middle)]
+    assert later == [3, 4], later
+    earlier = [data["n"] for _, _, _, data in read_journal(directory, until=middle)]
+    assert earlier == [1, 2], earlier
+
+
+def check_write_failure_is_swallowed(directory):
+    circular = {}
+    circular["self"] = circular
+    with TickJournal(directory) as journal:
+        journal.record("u", "balances", circular)
+        journal.record("u", "balances", {"ok": True})
+        # Force a rotation into a directory that cannot be created
+        journal.directory = os.path.join(journal._file.name, "missing")
+        journal.max_bytes = 0
+        journal.record("u", "balances", {"rotated": True})
+    records = [data for _, _, _, data in read_journal(directory)]
+    assert records == [{"ok": True}], records
+
+
+def main():
+    for check in [
+        check_reopen_and_torn_tail,
+        check_overlapping_runs,
+        check_rotate_and_prune,
+        check_filtered_read,
+        check_write_failure_is_swallowed,
+    ]:
+        with tempfile.TemporaryDirectory() as directory:
+            check(directory)
+        print(f"{check.__name__}: ok")
+
+
+if __name__ == "__main__":
+    main()
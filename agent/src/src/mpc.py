@@ -40,7 +40,6 @@ async def request_mpc_signature(payload: dict) -> MpcSignature:
             raise Exception("Failed to extract signature from transaction outcome.")
 
     try:
-        print(f"args: {args}")
         promise: TransactionResult = await signer_account.call(
             contract_id=contract_id,
             method_name=method_name,
@@ -48,11 +47,9 @@ async def request_mpc_signature(payload: dict) -> MpcSignature:
             gas=300000000000000,
             amount=0,
         )
-        print(f"balance promise: {promise.status}")
         base64_signature = await extract_base64_signature(promise)
         raw_buffer = base64.b64decode(base64_signature)
         parsed = json.loads(raw_buffer.decode())  # Assuming the response is a MpcSignature
-        print("MPC Signatures:", parsed)
         return MpcSignature(**parsed)
 
     except Exception as e:
@@ -72,7 +69,6 @@ async def request_mpc_signature(payload: dict) -> MpcSignature:
                 base64_signature = await extract_base64_signature(final_result)
                 raw_buffer = base64.b64decode(base64_signature)
                 parsed = json.loads(raw_buffer.decode())  # Assuming the response is a MpcSignature
-                print("MPC Signatures:", parsed)
                 return MpcSignature(**parsed)
 
             except Exception as poll_error:
@@ -97,7 +93,6 @@ async def wait_for_transaction(
     while (time.time() - start_time) * 1000 < total_timeout:
         try:
             result = await provider.get_tx_status(tx_hash, contract_id)
-            print(f"Result: {result}")
 
             if isinstance(result.status, dict):
                 status = result.status
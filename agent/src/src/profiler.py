@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextlib
+import collections.abc
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+def _is_idle_worker(frame) -> bool:
+    # Executor threads blocked on their work queue have `_worker` as the innermost frame
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+
+# Innermost frames of an event loop with nothing to run
+IDLE_LEAVES = {"select (selectors.py)"}
+
+# Interpreter, thread and event loop plumbing that sits under every sample,
+# including executor completion callbacks (set_result, _write_to_self)
+PLUMBING_FILES = {
+    "threading.py", "thread.py", "_base.py", "runners.py", "base_events.py",
+    "selector_events.py", "events.py", "selectors.py", "tasks.py", "futures.py",
+    os.path.basename(__file__),
+}
+
+# Stage for samples taken outside any profile_stage block
+UNSTAGED = "unstaged"
+
+
+def _hot_frames(frames):
+    # Distinct non-plumbing frames of a sample, so each is counted once per stack
+    hot = set()
+    for frame in frames:
+        name, _, filename = frame.rpartition(" (")
+        if name != "<module>" and filename.rstrip(")") not in PLUMBING_FILES:
+            hot.add(frame)
+    return hot
+
+
+class _TimedCoroutine(collections.abc.Coroutine):
+    """
+    Coroutine wrapper recording how long the wrapped coroutine actually ran.
+    """
+
+    def __init__(self, coro):
+        self._coro = coro
+        self.__qualname__ = getattr(coro, "__qualname__", type(coro).__name__)
+        self.running = 0.0
+
+    def send(self, value):
+        start = time.perf_counter()
+        try:
+            return self._coro.send(value)
+        finally:
+            self.running += time.perf_counter() - start
+
+    def throw(self, *args):
+        start = time.perf_counter()
+        try:
+            return self._coro.throw(*args)
+        finally:
+            self.running += time.perf_counter() - start
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+
+class TickProfiler:
+    """
+    Sampling CPU profiler with asyncio task wait-time attribution for an agent tick.
+
+    A background thread samples the stacks of every thread at a fixed interval and
+    attributes each sample to the stage that is currently active. Samples are
+    written in the collapsed stack format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, directory: str, interval_ms: float = 5):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.samples: Counter = Counter()
+        self.stage_wall: Dict[str, float] = defaultdict(float)
+        self.stage_cpu: Dict[str, float] = defaultdict(float)
+        # stage -> task name -> [count, running seconds, suspended seconds]
+        self.task_times: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0, 0.0]))
+        self._stage = UNSTAGED
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._previous_factory = None
+        self._loop_thread = None
+        self._started = 0.0
+        self.tick_wall = 0.0
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.current_thread().name
+        self._started = time.perf_counter()
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, name="tick-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[str]:
+        """
+        Stop sampling, write the collapsed stacks and print the hot spot report.
+
+        Failures are printed rather than raised so profiling never breaks a tick.
+
+        Returns:
+            Path of the written flamegraph file, or None if it could not be written
+        """
+        self._running = False
+        self.tick_wall = time.perf_counter() - self._started
+        if self._thread:
+            self._thread.join()
+        asyncio.get_running_loop().set_task_factory(self._previous_factory)
+
+        try:
+            print(self.report())
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"tick-{time.time_ns()}.folded")
+            with open(path, "w") as f:
+                for stack, count in self.samples.items():
+                    f.write(f"{stack} {count}\n")
+        except Exception as e:
+            print(f"Failed to write profile: {e}")
+            return None
+
+        print(f"Profile written to {path}")
+        return path
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        previous = self._stage
+        self._stage = name
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.stage_wall[name] += time.perf_counter() - wall
+            self.stage_cpu[name] += time.thread_time() - cpu
+            self._stage = previous
+
+    def report(self, top: int = 5) -> str:
+        """
+        Summarise wall time, event loop CPU time, task run and suspended time and
+        the hottest frames per stage.
+
+        Event loop and executor thread samples are reported separately. Hot spots
+        are inclusive: a frame is counted once for every busy sample it appears in,
+        so callers such as `generate_nonce` show up alongside the socket reads they
+        wait on. Samples taken outside any stage are reported as "unstaged".
+        """
+        loop_samples: Counter = Counter()
+        loop_idle: Counter = Counter()
+        loop_hot: Dict[str, Counter] = defaultdict(Counter)
+        worker_samples: Counter = Counter()
+        worker_hot: Dict[str, Counter] = defaultdict(Counter)
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            # frames[0] is the stage, frames[1] the thread name
+            stage, thread = frames[0], frames[1]
+            hot = _hot_frames(frames[2:])
+            if thread == self._loop_thread:
+                loop_samples[stage] += count
+                if frames[-1] in IDLE_LEAVES:
+                    loop_idle[stage] += count
+                    continue
+                for frame in hot:
+                    loop_hot[stage][frame] += count
+            elif hot:
+                # Workers running only completion callbacks have no hot frames
+                worker_samples[stage] += count
+                for frame in hot:
+                    worker_hot[stage][frame] += count
+
+        stages = list(self.stage_wall)
+        stages += [stage for stage in {**loop_samples, **worker_samples} if stage not in self.stage_wall]
+
+        lines = ["Tick profile:"]
+        for stage in stages:
+            if stage in self.stage_wall:
+                wall = self.stage_wall[stage]
+                cpu = self.stage_cpu[stage]
+                lines.append(f"  {stage}: wall {wall * 1000:.1f}ms, loop cpu {cpu * 1000:.1f}ms, loop wait {(wall - cpu) * 1000:.1f}ms")
+            else:
+                unstaged = self.tick_wall - sum(self.stage_wall.values())
+                lines.append(f"  {stage}: wall {unstaged * 1000:.1f}ms outside any stage")
+            tasks = sorted(self.task_times[stage].items(), key=lambda item: -item[1][2])[:top]
+            for task, (count, running, suspended) in tasks:
+                lines.append(f"    task {task} x{count}: ran {running * 1000:.1f}ms, suspended {suspended * 1000:.1f}ms")
+            if loop_samples[stage]:
+                lines.append(f"    event loop: {loop_idle[stage] * 100 / loop_samples[stage]:.1f}% idle")
+                for frame, count in loop_hot[stage].most_common(top):
+                    lines.append(f"      {count * 100 / loop_samples[stage]:5.1f}% {frame}")
+            if worker_samples[stage]:
+                lines.append(f"    executor threads: {worker_samples[stage]} busy samples")
+                for frame, count in worker_hot[stage].most_common(top):
+                    lines.append(f"      {count * 100 / worker_samples[stage]:5.1f}% {frame}")
+        return "\n".join(lines)
+
+    def _task_factory(self, loop, coro, **kwargs):
+        timed = _TimedCoroutine(coro)
+        if self._previous_factory:
+            task = self._previous_factory(loop, timed, **kwargs)
+        else:
+            task = asyncio.Task(timed, loop=loop, **kwargs)
+        stage = self._stage
+        created = time.perf_counter()
+
+        def done(_):
+            times = self.task_times[stage][timed.__qualname__]
+            times[0] += 1
+            times[1] += timed.running
+            times[2] += time.perf_counter() - created - timed.running
+
+        task.add_done_callback(done)
+        return task
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while self._running:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stage = self._stage
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle_worker(frame):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_label(frame))
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                frames.append(stage)
+                self.samples[";".join(reversed(frames))] += 1
+            time.sleep(self.interval)
+
+
+def create_profiler(env_vars: dict) -> Optional[TickProfiler]:
+    """
+    Create a profiler if profiling is switched on through the `profile` env var.
+
+    Args:
+        env_vars: The agent's env vars
+
+    Returns:
+        A TickProfiler, or None when profiling is off
+    """
+    if str(env_vars.get("profile", "")).lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        interval_ms = float(env_vars.get("profile_interval_ms", 5))
+    except (TypeError, ValueError):
+        print("Invalid profile_interval_ms, using 5ms")
+        interval_ms = 5
+    return TickProfiler(env_vars.get("profile_dir", "profiles"), interval_ms=interval_ms)
+
+
+def profile_stage(profiler: Optional[TickProfiler], name: str):
+    """
+    Context manager marking a tick stage; a no-op when profiling is off.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)